@@ -0,0 +1,16 @@
+-- Index for the "newest first" reads in main.py
+-- (/sensor_data and /sensor_data/latest both ORDER BY
+-- timestamp DESC NULLS LAST, id DESC with a LIMIT).
+--
+-- Matching the ORDER BY exactly lets Postgres walk the index and stop at
+-- the LIMIT instead of sorting the table; the INCLUDE columns make it
+-- covering, so it can answer with an Index Only Scan.
+--
+-- CONCURRENTLY doesn't block uploads while it builds, but it can't run
+-- inside a transaction block, so run the file with psql:
+--   psql "$DATABASE_URL" -f migrations/001_sensor_data_ts_desc_idx.sql
+-- Check with EXPLAIN (ANALYZE, BUFFERS) on the /sensor_data/latest query.
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS sensor_data_ts_desc_idx
+    ON sensor_data (timestamp DESC NULLS LAST, id DESC)
+    INCLUDE (temperature, humidity, latitude, longitude, fire_score, pressure, gas);